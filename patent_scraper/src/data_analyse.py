@@ -1,52 +1,238 @@
-from flask import Flask, jsonify, request
+from flask import Flask, Response, jsonify, request
+import hashlib
 import json
+import mmap
 import os
+import sys
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime
 from typing import List, Dict, Set
 from pathlib import Path
 import logging
 import re
-from functools import wraps
+from functools import lru_cache, wraps
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Prefer orjson's vectorized C parser (typically 3-6x faster than the stdlib
+# module, identical dict/list output), then ujson, then stdlib json.
+try:
+    import orjson
+
+    def _json_loads(data):
+        return orjson.loads(data)
+
+    # orjson accepts any buffer-protocol object, so files can be mmapped
+    # straight into the parser without an intermediate bytes copy
+    _PARSER_ACCEPTS_BUFFERS = True
+except ImportError:
+    _PARSER_ACCEPTS_BUFFERS = False
+    try:
+        import ujson
+
+        def _json_loads(data):
+            return ujson.loads(data)
+    except ImportError:
+        def _json_loads(data):
+            return json.loads(data)
+
+# Optional incremental parser for very large files; prefer the C backend
+try:
+    import ijson.backends.yajl2_c as ijson
+except ImportError:
+    try:
+        import ijson
+    except ImportError:
+        ijson = None
+
+# Files above this size are stream-parsed record-by-record instead of
+# being materialized as one buffer (multi-hundred-MB weekly USPTO dumps)
+_STREAM_THRESHOLD_BYTES = 32 << 20
+
+# Optional columnar fast path: consolidated Parquet batches written at
+# ingest time load in one read each instead of many small JSON parses
+try:
+    import pyarrow.parquet as pq
+except ImportError:
+    pq = None
+
+PARQUET_DIR = Path("datalake/transformed/parquet")
+
 app = Flask(__name__)
 
+# Serialize responses with orjson's C writer when available; large distinct
+# lists dominate response time under the stdlib encoder
+try:
+    import orjson
+    from flask.json.provider import JSONProvider
+
+    class OrjsonProvider(JSONProvider):
+        """Flask JSON provider backed by orjson."""
+
+        def dumps(self, obj, **kwargs):
+            return orjson.dumps(obj).decode()
+
+        def loads(self, s, **kwargs):
+            return orjson.loads(s)
+
+    app.json = OrjsonProvider(app)
+except ImportError:
+    pass
+
 # Directory containing patent JSON files
 PATENTS_DIR = Path("datalake/transformed/patents")
 PATENTS_DATA: List[Dict] = []
 
+# Distinct-field indexes, precomputed once after load (see build_indexes)
+ALL_INVENTORS: frozenset = frozenset()
+ALL_ASSIGNEES: frozenset = frozenset()
+ALL_TITLES: frozenset = frozenset()
+
+# Presorted views of the above, so the unfiltered path never re-sorts
+SORTED_INVENTORS: tuple = ()
+SORTED_ASSIGNEES: tuple = ()
+SORTED_TITLES: tuple = ()
+
+# Inverted index: 4-char CPC subclass prefix (e.g. "G16B") -> patent indices
+CPC_PREFIX_INDEX: Dict[str, List[int]] = {}
+_CPC_PREFIX_LEN = 4
+_REGEX_METACHARS = set('.^$*+?{}[]\\|()')
+# A full CPC subclass (letter, two digits, letter) only occurs at the start of a code
+_CPC_SUBCLASS_RE = re.compile(r'[A-HY][0-9][0-9][A-Z]')
+
+# Columnar (structure-of-arrays) view of the CPC field, aligned with
+# PATENTS_DATA, so the filter scans a flat tuple instead of per-dict lookups
+CPC_COLUMN: tuple = ()
+
+# Each patent's CPC codes joined with a NUL sentinel, aligned with
+# CPC_COLUMN; lets the literal filter run one C-level substring search
+# per patent instead of a Python loop over its codes
+CPC_BLOB_COLUMN: tuple = ()
+
+# Bumped on every (re)load; keys the response caches so stale entries die
+DATA_VERSION = 0
+
+# ETag for the loaded dataset; lets clients revalidate with a 304 instead
+# of re-downloading distinct lists that only change on reload
+DATA_ETAG = ""
+
+def _load_one(json_file: Path):
+    """Load and parse a single patent JSON or JSONL file."""
+    # Binary read: orjson parses bytes directly, skipping a decode pass
+    with open(json_file, 'rb') as f:
+        if json_file.suffix == '.jsonl':
+            # Newline-delimited records, one parse per line
+            return [_json_loads(line) for line in f if line.strip()]
+        if ijson is not None and json_file.stat().st_size > _STREAM_THRESHOLD_BYTES:
+            head = f.read(64).lstrip()
+            f.seek(0)
+            if head.startswith(b'['):
+                # Stream records incrementally so peak memory stays at
+                # one record, not the whole file plus its parse tree
+                return list(ijson.items(f, 'item'))
+        if _PARSER_ACCEPTS_BUFFERS:
+            try:
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                    return _json_loads(mm)
+            except (ValueError, OSError):
+                pass  # empty file or filesystem without mmap support
+        return _json_loads(f.read())
+
+def _load_worker_count(num_files: int) -> int:
+    """Number of loader workers; override with the PATENT_LOAD_WORKERS env var (e.g. 1 for rotating disks)."""
+    workers = int(os.environ.get('PATENT_LOAD_WORKERS', 0))
+    if workers < 1:
+        workers = min(num_files, os.cpu_count() or 1)
+    return max(workers, 1)
+
 def load_flattened_patent_data() -> List[Dict]:
     """Load and flatten all patent JSON files from the patents directory into a single list of patent dicts."""
     patents = []
-    
+
     logger.info(f"Attempting to load patents from: {PATENTS_DIR.absolute()}")
-    
+
     if not PATENTS_DIR.exists():
         logger.error(f"Directory does not exist: {PATENTS_DIR.absolute()}")
         return patents
-    
-    # Find all JSON files in the main directory and all subdirectories
-    json_files = list(PATENTS_DIR.glob('**/*.json'))
+
+    # Consolidated Parquet batches first; each covers one ingest batch
+    parquet_batches = set()
+    if pq is not None and PARQUET_DIR.exists():
+        for parquet_file in sorted(PARQUET_DIR.glob('*.parquet')):
+            try:
+                patents.extend(pq.read_table(parquet_file).to_pylist())
+                parquet_batches.add(parquet_file.stem)
+            except Exception as e:
+                logger.error(f"Error loading {parquet_file}: {str(e)}")
+        logger.info(f"Loaded {len(parquet_batches)} Parquet batches")
+
+    # Find all JSON/JSONL files in the main directory and all
+    # subdirectories, skipping batches already served by a Parquet snapshot
+    json_files = [f for pattern in ('**/*.json', '**/*.jsonl')
+                  for f in PATENTS_DIR.glob(pattern) if f.parent.name not in parquet_batches]
     logger.info(f"Found {len(json_files)} JSON files")
-    
-    for json_file in json_files:
-        try:
-            logger.info(f"Loading file: {json_file}")
-            with open(json_file, 'r', encoding='utf-8') as f:
-                file_data = json.load(f)
+
+    if json_files:
+        # Parse files in parallel; extend/append results in the main thread
+        with ThreadPoolExecutor(max_workers=_load_worker_count(len(json_files))) as pool:
+            futures = {pool.submit(_load_one, json_file): json_file for json_file in json_files}
+            for future in as_completed(futures):
+                json_file = futures[future]
+                try:
+                    file_data = future.result()
+                except Exception as e:
+                    logger.error(f"Error loading {json_file}: {str(e)}")
+                    continue
                 if isinstance(file_data, list):
                     patents.extend(file_data)
                 elif isinstance(file_data, dict):
                     patents.append(file_data)
-            logger.info(f"Successfully loaded {json_file}")
-        except Exception as e:
-            logger.error(f"Error loading {json_file}: {str(e)}")
-    
+                logger.info(f"Successfully loaded {json_file}")
+
+    _intern_shared_strings(patents)
     logger.info(f"Total patent records loaded: {len(patents)}")
     return patents
 
+def _intern_shared_strings(patents: List[Dict]) -> None:
+    """Intern heavily duplicated field values in place so repeats share one str object and its cached hash."""
+    intern = sys.intern
+    for patent in patents:
+        for key in ('inventors', 'assignees', 'cpc_classifications'):
+            values = patent.get(key)
+            if values:
+                patent[key] = [intern(v) for v in values]
+
+def build_indexes() -> None:
+    """Precompute distinct-field indexes over PATENTS_DATA so unfiltered requests skip the full rescan."""
+    global ALL_INVENTORS, ALL_ASSIGNEES, ALL_TITLES, CPC_COLUMN, CPC_BLOB_COLUMN
+    global SORTED_INVENTORS, SORTED_ASSIGNEES, SORTED_TITLES
+    ALL_INVENTORS = frozenset(get_distinct_inventors(PATENTS_DATA))
+    ALL_ASSIGNEES = frozenset(get_distinct_assignees(PATENTS_DATA))
+    ALL_TITLES = frozenset(get_distinct_titles(PATENTS_DATA))
+    SORTED_INVENTORS = tuple(sorted(ALL_INVENTORS))
+    SORTED_ASSIGNEES = tuple(sorted(ALL_ASSIGNEES))
+    SORTED_TITLES = tuple(sorted(ALL_TITLES))
+    CPC_COLUMN = tuple(tuple(p.get('cpc_classifications', ())) for p in PATENTS_DATA)
+    CPC_BLOB_COLUMN = tuple('\x00'.join(cpcs) for cpcs in CPC_COLUMN)
+    CPC_PREFIX_INDEX.clear()
+    for i, cpcs in enumerate(CPC_COLUMN):
+        for prefix in {cpc[:_CPC_PREFIX_LEN] for cpc in cpcs}:
+            CPC_PREFIX_INDEX.setdefault(prefix, []).append(i)
+    logger.info(
+        f"Indexed {len(ALL_INVENTORS)} inventors, {len(ALL_ASSIGNEES)} assignees, {len(ALL_TITLES)} titles"
+    )
+
+def initialize_data() -> None:
+    """Load the patent data into memory and build the precomputed indexes."""
+    global PATENTS_DATA, DATA_VERSION, DATA_ETAG
+    PATENTS_DATA = load_flattened_patent_data()
+    build_indexes()
+    DATA_VERSION += 1
+    DATA_ETAG = hashlib.blake2b(
+        f"{len(PATENTS_DATA)}:{DATA_VERSION}:{datetime.now().timestamp()}".encode()
+    ).hexdigest()[:16]
+
 # Helper functions for extracting distinct fields
 
 def get_distinct_inventors(patents: List[Dict]) -> Set[str]:
@@ -63,34 +249,124 @@ def get_distinct_titles(patents: List[Dict]) -> Set[str]:
 
 # Filtering logic
 
+@lru_cache(maxsize=256)
+def _cpc_re(pattern: str) -> re.Pattern:
+    """Compile and cache a CPC regex so repeat queries reuse the compiled object directly."""
+    return re.compile(pattern)
+
+def _literal_prefix(query: str) -> str:
+    """Return the leading run of literal characters in a query; regex metacharacters end it."""
+    if query.startswith('^'):
+        query = query[1:]
+    literal = []
+    for ch in query:
+        if ch in _REGEX_METACHARS:
+            break
+        literal.append(ch)
+    return ''.join(literal)
+
+def _cpc_candidate_indices(cpc_class: str, use_regex: bool = False):
+    """
+    Candidate patent indices for a CPC query, or every index when the
+    prefix index cannot prune soundly.
+
+    The index is keyed on the first four characters of each code (its
+    subclass, e.g. "G16B"), while both filters are substring searches —
+    a query like "30/00" legitimately matches mid-code. Pruning is
+    therefore only safe when the query's leading four characters form a
+    full subclass pattern (letter-digit-digit-letter), which can only
+    ever occur at the start of a code. For regexes the leading literal
+    must additionally be a guaranteed match prefix: a top-level
+    alternation voids it entirely, and a quantifier right after it can
+    make its last character optional.
+    """
+    if use_regex:
+        if '|' in cpc_class:
+            return range(len(PATENTS_DATA))
+        prefix = _literal_prefix(cpc_class)
+        rest = cpc_class[len(prefix) + (1 if cpc_class.startswith('^') else 0):]
+        if rest[:1] in ('?', '*', '{'):
+            prefix = prefix[:-1]
+    else:
+        prefix = cpc_class
+    if len(prefix) >= _CPC_PREFIX_LEN and _CPC_SUBCLASS_RE.fullmatch(prefix[:_CPC_PREFIX_LEN]):
+        return CPC_PREFIX_INDEX.get(prefix[:_CPC_PREFIX_LEN], [])
+    return range(len(PATENTS_DATA))
+
 def filter_patents_by_cpc(patents: List[Dict], cpc_class: str = None, use_regex: bool = False) -> List[Dict]:
     """Filter patents by CPC classification, supporting regex if specified."""
     if not cpc_class:
         return patents
     if use_regex:
         try:
-            pattern = re.compile(cpc_class)
+            pattern = _cpc_re(cpc_class)
         except re.error as e:
             logger.error(f"Invalid regex pattern for CPC class: {cpc_class} ({e})")
             return []
-        return [p for p in patents if any(pattern.search(cpc) for cpc in p.get('cpc_classifications', []))]
-    return [p for p in patents if any(cpc_class in cpc for cpc in p.get('cpc_classifications', []))]
+        search = pattern.search
+
+        def keep(cpcs):
+            return any(search(cpc) for cpc in cpcs)
+    else:
+        def keep(cpcs):
+            return any(cpc_class in cpc for cpc in cpcs)
+    if patents is PATENTS_DATA:
+        # Columnar scan: flat tuple lookups instead of per-dict .get calls
+        if not use_regex:
+            # One C-level substring search over the joined blob per patent
+            return [PATENTS_DATA[i] for i in _cpc_candidate_indices(cpc_class)
+                    if cpc_class in CPC_BLOB_COLUMN[i]]
+        return [PATENTS_DATA[i] for i in _cpc_candidate_indices(cpc_class, use_regex=True)
+                if keep(CPC_COLUMN[i])]
+    return [p for p in patents if keep(p.get('cpc_classifications', ()))]
+
+def filter_patents_by_cpc_multi(patents: List[Dict], cpc_classes: List[str]) -> List[Dict]:
+    """Filter patents matching any of several CPC classes with a single fused alternation scan."""
+    cpc_classes = [c for c in cpc_classes if c]
+    if not cpc_classes:
+        return patents
+    if len(cpc_classes) == 1:
+        return filter_patents_by_cpc(patents, cpc_classes[0])
+    # One compiled alternation beats running N separate scans per patent
+    search = _cpc_re('|'.join(re.escape(c) for c in cpc_classes)).search
+    if patents is PATENTS_DATA:
+        return [PATENTS_DATA[i] for i, blob in enumerate(CPC_BLOB_COLUMN) if search(blob)]
+    return [p for p in patents if any(search(cpc) for cpc in p.get('cpc_classifications', ()))]
+
+def _apply_cpc_filter(patents: List[Dict], cpc_class: str, use_regex: bool) -> List[Dict]:
+    """Dispatch a cpc_class query: commas separate alternatives in literal (non-regex) queries."""
+    if cpc_class and not use_regex and ',' in cpc_class:
+        return filter_patents_by_cpc_multi(patents, cpc_class.split(','))
+    return filter_patents_by_cpc(patents, cpc_class, use_regex)
 
 # Decorator for extracting and filtering query params
 
 def with_filtered_patents(func):
     @wraps(func)
     def wrapper(*args, **kwargs):
+        not_modified = _etag_shortcut()
+        if not_modified is not None:
+            return not_modified
         cpc_class = request.args.get('cpc_class')
         use_regex = request.args.get('use_regex', 'false').lower() == 'true'
-        filtered = filter_patents_by_cpc(PATENTS_DATA, cpc_class, use_regex)
-        return func(filtered, *args, **kwargs)
+        filtered = _apply_cpc_filter(PATENTS_DATA, cpc_class, use_regex)
+        response = func(filtered, *args, **kwargs)
+        response.headers['ETag'] = DATA_ETAG
+        return response
     return wrapper
 
+def _etag_shortcut():
+    """Return a 304 response when the client already holds the current dataset ETag, else None."""
+    if DATA_ETAG and request.headers.get('If-None-Match') == DATA_ETAG:
+        return Response(status=304, headers={'ETag': DATA_ETAG})
+    return None
+
 @app.route('/api/inventors', methods=['GET'])
 @with_filtered_patents
 def api_inventors(filtered_patents):
     """Return a list of distinct inventors from the loaded patent data."""
+    if filtered_patents is PATENTS_DATA:
+        return jsonify(SORTED_INVENTORS)
     if not filtered_patents:
         return jsonify([])
     return jsonify(sorted(get_distinct_inventors(filtered_patents)))
@@ -99,6 +375,8 @@ def api_inventors(filtered_patents):
 @with_filtered_patents
 def api_assignees(filtered_patents):
     """Return a list of distinct assignees from the loaded patent data."""
+    if filtered_patents is PATENTS_DATA:
+        return jsonify(SORTED_ASSIGNEES)
     if not filtered_patents:
         return jsonify([])
     return jsonify(sorted(get_distinct_assignees(filtered_patents)))
@@ -107,26 +385,50 @@ def api_assignees(filtered_patents):
 @with_filtered_patents
 def api_titles(filtered_patents):
     """Return a list of distinct patent titles from the loaded patent data."""
+    if filtered_patents is PATENTS_DATA:
+        return jsonify(SORTED_TITLES)
     if not filtered_patents:
         return jsonify([])
     return jsonify(sorted(get_distinct_titles(filtered_patents)))
 
-@app.route('/api/summary', methods=['GET'])
-@with_filtered_patents
-def api_summary(filtered_patents):
-    """Return a summary of inventors, assignees, and titles from the loaded patent data."""
+@lru_cache(maxsize=1024)
+def _summary_json(cpc_class, use_regex, data_version) -> str:
+    """Build the serialized summary for a query; cacheable because the data is immutable per data_version."""
+    filtered_patents = _apply_cpc_filter(PATENTS_DATA, cpc_class, use_regex)
     if not filtered_patents:
-        return jsonify({'inventors': [], 'assignees': [], 'titles': []})
-    inventors = get_distinct_inventors(filtered_patents)
-    assignees = get_distinct_assignees(filtered_patents)
-    titles = get_distinct_titles(filtered_patents)
+        return app.json.dumps({'inventors': [], 'assignees': [], 'titles': []})
+    if filtered_patents is PATENTS_DATA:
+        inventors, assignees, titles = SORTED_INVENTORS, SORTED_ASSIGNEES, SORTED_TITLES
+    else:
+        # One traversal builds all three sets instead of three scans
+        inventor_set, assignee_set, title_set = set(), set(), set()
+        for patent in filtered_patents:
+            inventor_set.update(patent.get('inventors', ()))
+            assignee_set.update(patent.get('assignees', ()))
+            title = patent.get('invention_title')
+            if title:
+                title_set.add(title)
+        inventors = sorted(inventor_set)
+        assignees = sorted(assignee_set)
+        titles = sorted(title_set)
     summary = {
-        'inventors': sorted(inventors),
-        'assignees': sorted(assignees),
-        'titles': sorted(titles),
+        'inventors': inventors,
+        'assignees': assignees,
+        'titles': titles,
         'summary': f'{len(filtered_patents)} records, {len(inventors)} inventors, {len(assignees)} assignees, {len(titles)} titles'
     }
-    return jsonify(summary)
+    return app.json.dumps(summary)
+
+@app.route('/api/summary', methods=['GET'])
+def api_summary():
+    """Return a summary of inventors, assignees, and titles from the loaded patent data."""
+    not_modified = _etag_shortcut()
+    if not_modified is not None:
+        return not_modified
+    cpc_class = request.args.get('cpc_class')
+    use_regex = request.args.get('use_regex', 'false').lower() == 'true'
+    return Response(_summary_json(cpc_class, use_regex, DATA_VERSION),
+                    mimetype='application/json', headers={'ETag': DATA_ETAG})
 
 
 
@@ -135,6 +437,6 @@ if __name__ == '__main__':
     logger.info(f"Current working directory: {os.getcwd()}")
     logger.info(f"Looking for patents in: {PATENTS_DIR.absolute()}")
     logger.info("Loading patent data...")
-    PATENTS_DATA = load_flattened_patent_data()
+    initialize_data()
     logger.info(f"Loaded {len(PATENTS_DATA)} patent records into memory")
     app.run(debug=True, port=5000)
@@ -1,10 +1,18 @@
 import os
 import glob
+import xml.etree.ElementTree as ET
+import zipfile
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from pathlib import Path
 import logging
 
-from data_prepare import process_patent_zip, process_all_xml_files
-from data_transform import extract_patent_data_from_xml_docs, store_patent_data
+from data_prepare import process_patent_zip, process_all_xml_files, archive_raw_file
+from data_transform import (
+    extract_patent_data_from_xml_docs,
+    store_patent_data,
+    iter_patents_from_zip,
+    consolidate_to_parquet,
+)
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -43,10 +51,49 @@ def download_uspto_zip(year, file_name, data_type="grant"):
     return None
 
 
-def process_zip_file(zip_file_path):
-    """Process a single zip file and return the path to the stored JSON file."""
+def process_zip_file(zip_file_path, stream=True):
+    """
+    Process a single zip file and return the path to the stored JSON file.
+
+    By default the XML is parsed straight out of the compressed stream,
+    so the decompressed payload never touches the prepared directory.
+    Pass stream=False to run the old extract-to-disk pipeline, which
+    leaves the intermediate files around for inspection.
+    """
     logger.info(f"Processing zip file: {zip_file_path}")
-    
+
+    if not stream:
+        return _process_zip_file_extracted(zip_file_path)
+
+    zip_basename = os.path.basename(zip_file_path).split('.')[0]
+    output_dir = os.path.join("datalake", "transformed", "patents", zip_basename)
+    try:
+        all_patent_data = list(iter_patents_from_zip(zip_file_path))
+    except (zipfile.BadZipFile, OSError) as exc:
+        logger.error(f"Failed to read ZIP file {zip_file_path}: {exc}")
+        return None
+    except ET.ParseError as exc:
+        # The fused stream shares one parser, so a single malformed
+        # document poisons the rest of the archive. Re-run it through
+        # the extract-to-disk path, which parses per document and skips
+        # the bad ones instead of losing the whole ZIP.
+        logger.error(f"Malformed XML in {zip_file_path} ({exc}); "
+                     "falling back to extract-to-disk processing")
+        return _process_zip_file_extracted(zip_file_path)
+    if not all_patent_data:
+        logger.error(f"No patent documents found in: {zip_file_path}")
+        return None
+
+    stored_file = store_patent_data(all_patent_data, output_dir)
+    consolidate_to_parquet(all_patent_data, zip_basename)
+    logger.info(f"Patent data stored in: {stored_file}")
+    if not archive_raw_file(zip_file_path, output_dir):
+        logger.warning("Failed to archive raw file")
+    return stored_file
+
+
+def _process_zip_file_extracted(zip_file_path):
+    """Extract-to-disk pipeline; debugging fallback for process_zip_file."""
     prepared_dir = process_patent_zip(zip_file_path)
     if not prepared_dir:
         logger.error(f"Failed to process ZIP file: {zip_file_path}")
@@ -71,23 +118,46 @@ def process_zip_file(zip_file_path):
     return None
 
 
+def _ingest_worker_count(num_zips):
+    """Number of ingestion workers; override with the PATENT_INGEST_WORKERS env var (e.g. 1 for rotating disks)."""
+    workers = int(os.environ.get('PATENT_INGEST_WORKERS', 0))
+    if workers < 1:
+        workers = min(num_zips, os.cpu_count() or 1)
+    return max(workers, 1)
+
+
 def process_all_zip_files():
     """Process all ZIP files in the raw patents directory."""
     raw_dir = os.path.join("datalake", "raw", "patents")
     zip_files = glob.glob(os.path.join(raw_dir, "*.zip"))
-    
+
     if not zip_files:
         logger.warning(f"No ZIP files found in {raw_dir}")
         return []
-    
+
     logger.info(f"Found {len(zip_files)} ZIP files to process")
+
+    if len(zip_files) == 1:
+        result = process_zip_file(zip_files[0])
+        return [result] if result else []
+
+    # Each ZIP is independent and CPU-heavy (unzip, XML split, JSON write),
+    # so fan the files out across worker processes. as_completed keeps the
+    # extraction I/O of one ZIP overlapped with the parse CPU of another and
+    # lets fast files finish without queueing behind slow ones.
     results = []
-    
-    for zip_file in zip_files:
-        result = process_zip_file(zip_file)
-        if result:
-            results.append(result)
-    
+    with ProcessPoolExecutor(max_workers=_ingest_worker_count(len(zip_files))) as pool:
+        futures = {pool.submit(process_zip_file, zip_file): zip_file for zip_file in zip_files}
+        for future in as_completed(futures):
+            zip_file = futures[future]
+            try:
+                result = future.result()
+            except Exception as exc:
+                logger.error(f"Failed to process {zip_file}: {exc}")
+                continue
+            if result:
+                results.append(result)
+
     return results
 
 